@@ -0,0 +1,49 @@
+# bulk ListBuilder.extend / StructBuilder.update against chained append / set
+#
+#   python benchmarks/bench_builder.py [count]
+
+import sys
+
+import scl
+from bench_codec import bench
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rounds = 3
+
+    ints = list(range(count))
+    strs = [f"item-{i}" for i in ints]
+    fields = {f"k{i}": i for i in range(count // 10)}
+
+    def appendInts():
+        b = scl.Doc.new().newList()
+        for v in ints:
+            b.append(v)
+
+    def appendStrs():
+        b = scl.Doc.new().newList()
+        for v in strs:
+            b.append(v)
+
+    def setFields():
+        b = scl.Doc.new().newStruct()
+        for k, v in fields.items():
+            b.set(k, v)
+
+    rows = [
+        bench("append int", appendInts, rounds),
+        bench("extend int", lambda: scl.Doc.new().newList().extend(ints), rounds),
+        bench("extend int typed", lambda: scl.Doc.new().newList().extend(ints, type=scl.INT), rounds),
+        bench("append str", appendStrs, rounds),
+        bench("extend str typed", lambda: scl.Doc.new().newList().extend(strs, type=scl.STRING), rounds),
+        bench("set", setFields, rounds),
+        bench("update typed", lambda: scl.Doc.new().newStruct().update(fields, type=scl.INT), rounds),
+    ]
+
+    print(f"{count} elements, {len(fields)} struct fields")
+    print(f"{'case':<18} {'best ms':>10}")
+    for label, best, _ in rows:
+        print(f"{label:<18} {best * 1000:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# size and time of the binary exports against toJson
+#
+#   python benchmarks/bench_codec.py [services]
+
+import json
+import sys
+import time
+
+import scl
+
+def buildDoc(services):
+    doc = scl.Doc.new()
+    doc.set("name", "edge-fleet")
+    doc.set("revision", 42)
+    doc.set("cert", bytes(range(256)) * 16)
+
+    lst = doc.newList()
+    for i in range(services):
+        tags = doc.newList().append("prod").append(f"zone-{i % 8}").build()
+        svc = (
+            doc.newStruct()
+            .set("host", f"svc-{i}.internal")
+            .set("port", 8000 + i % 1000)
+            .set("weight", i / services)
+            .set("enabled", i % 3 != 0)
+            .set("tags", tags)
+            .build()
+        )
+        lst.append(svc)
+    doc.set("services", lst.build())
+    return doc
+
+def bench(label, fn, rounds):
+    best = float("inf")
+    out = None
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return label, best, out
+
+def main():
+    services = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rounds = 5
+
+    doc = buildDoc(services)
+
+    def jsonReencode():
+        # what callers did before: JSON text, parsed back to re-encode elsewhere
+        text = doc.toJson()
+        json.loads(text)
+        return text
+
+    rows = [
+        bench("toJson", doc.toJson, rounds),
+        bench("toJson+loads", jsonReencode, rounds),
+        bench("toMsgpack", doc.toMsgpack, rounds),
+        bench("toCbor", doc.toCbor, rounds),
+    ]
+
+    print(f"{'format':<12} {'bytes':>10} {'best ms':>10}")
+    for label, best, out in rows:
+        size = len(out.encode()) if isinstance(out, str) else len(out)
+        print(f"{label:<12} {size:>10} {best * 1000:>10.2f}")
+
+    mp = rows[2][2]
+    cb = rows[3][2]
+    for label, best, _ in (
+        bench("fromMsgpack", lambda: scl.Doc.fromMsgpack(mp), rounds),
+        bench("fromCbor", lambda: scl.Doc.fromCbor(cb), rounds),
+    ):
+        print(f"{label:<12} {'':>10} {best * 1000:>10.2f}")
+
+if __name__ == "__main__":
+    main()
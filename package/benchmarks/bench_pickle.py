@@ -0,0 +1,61 @@
+# pickle round trip of a parsed Doc (sent as source) and a built one (sent as a snapshot)
+#
+#   python benchmarks/bench_pickle.py [services]
+
+import pickle
+import sys
+
+import scl
+from bench_codec import bench, buildDoc
+
+def buildSource(services):
+    lines = ["@scl 1", 'name: string = "edge-fleet"', "revision: int = 42"]
+    for i in range(services):
+        lines.append(f"svc{i}: struct {{")
+        lines.append("    host: string")
+        lines.append("    port: int")
+        lines.append("    weight: float")
+        lines.append("    enabled: bool")
+        lines.append("    tags: [string]")
+        lines.append("    timeout: duration")
+        lines.append("} = {")
+        lines.append(f'    host = "svc-{i}.internal"')
+        lines.append(f"    port = {8000 + i % 1000}")
+        lines.append(f"    weight = {i / services}")
+        lines.append(f"    enabled = {'true' if i % 3 else 'false'}")
+        lines.append(f'    tags = ["prod", "zone-{i % 8}"]')
+        lines.append(f"    timeout = {1 + i % 30}s")
+        lines.append("}")
+    return "\n".join(lines) + "\n"
+
+def main():
+    services = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rounds = 5
+
+    src = buildSource(services)
+    doc = scl.parse(src)
+    blob = pickle.dumps(doc, 5)
+    built = buildDoc(services)
+    builtBlob = pickle.dumps(built, 5)
+
+    def oob():
+        buffers = []
+        data = pickle.dumps(built, 5, buffer_callback=buffers.append)
+        return pickle.loads(data, buffers=buffers)
+
+    rows = [
+        bench("parse(text)", lambda: scl.parse(src), rounds),
+        bench("parsed dumps", lambda: pickle.dumps(doc, 5), rounds),
+        bench("parsed loads", lambda: pickle.loads(blob), rounds),
+        bench("built dumps", lambda: pickle.dumps(built, 5), rounds),
+        bench("built loads", lambda: pickle.loads(builtBlob), rounds),
+        bench("built oob", oob, rounds),
+    ]
+
+    print(f"text {len(src.encode())} bytes, parsed pickle {len(blob)} bytes, built pickle {len(builtBlob)} bytes")
+    print(f"{'step':<16} {'best ms':>10}")
+    for label, best, _ in rows:
+        print(f"{label:<16} {best * 1000:>10.2f}")
+
+if __name__ == "__main__":
+    main()
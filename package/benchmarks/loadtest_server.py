@@ -0,0 +1,80 @@
+# local load test for scl.server: queries per second and latency percentiles
+#
+#   python benchmarks/loadtest_server.py [--clients 8] [--seconds 5] [--pipeline 1] [--cache]
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from bench_pickle import buildSource
+from scl.client import Client
+from scl.server import Server
+
+QUERIES = [("fleet", "name"), ("fleet", "revision"), ("fleet", "svc0"), ("fleet", "svc1.port"), ("fleet", "")]
+
+def worker(socketPath, seconds, pipeline, cache, out):
+    client = Client(socketPath, poolSize=1, cache=cache)
+    latencies = []
+    batch = [QUERIES[i % len(QUERIES)] for i in range(pipeline)]
+    deadline = time.perf_counter() + seconds
+    try:
+        while True:
+            t0 = time.perf_counter()
+            if t0 >= deadline:
+                break
+            if pipeline == 1:
+                client.get(*batch[0])
+            else:
+                client.getMany(batch)
+            latencies.append(time.perf_counter() - t0)
+    finally:
+        # a failed worker still reports, so the parent does not wait forever
+        client.close()
+        out.put(latencies)
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--pipeline", type=int, default=1, help="queries per round trip")
+    parser.add_argument("--services", type=int, default=200, help="size of the served doc")
+    parser.add_argument("--cache", action="store_true", help="enable the client-side cache")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, "fleet.scl")
+    with open(path, "w") as f:
+        # serialize() output does not parse back, write real source
+        f.write(buildSource(args.services))
+    socketPath = os.path.join(tmp, "scl.sock")
+
+    with Server(socketPath, [path], interval=0).start():
+        out = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=worker, args=(socketPath, args.seconds, args.pipeline, args.cache, out))
+            for _ in range(args.clients)
+        ]
+        for p in procs:
+            p.start()
+        latencies = []
+        for _ in procs:
+            latencies.extend(out.get())
+        for p in procs:
+            p.join()
+
+    latencies.sort()
+    queries = len(latencies) * args.pipeline
+    print(f"clients {args.clients}, pipeline {args.pipeline}, cache {'on' if args.cache else 'off'}")
+    print(f"queries    {queries}, latency is per round trip")
+    print(f"qps        {queries / args.seconds:,.0f}")
+    print(f"p50 ms     {percentile(latencies, 0.50) * 1000:.3f}")
+    print(f"p99 ms     {percentile(latencies, 0.99) * 1000:.3f}")
+    print(f"max ms     {latencies[-1] * 1000:.3f}")
+
+if __name__ == "__main__":
+    main()
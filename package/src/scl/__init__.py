@@ -17,7 +17,7 @@ from .scl import (
     STRUCT,
     UNION,
 )
-from .errors import ParseError, TomlError
+from .errors import ParseError, TomlError, ServerError
 from .opts import ParseOpts
 from .doc import Doc
 from .value import Value
@@ -0,0 +1,358 @@
+import logging
+import queue
+import socket
+import threading
+
+from . import codec as _codec
+from . import protocol as _proto
+from .errors import ServerError
+
+# client for scl.server: pooled connections, pipelined batches, cache keyed on the doc generation
+
+_log = logging.getLogger("scl.client")
+
+_BATCH_FRAMES = 64
+_BATCH_BYTES = 32 << 10
+
+# listener reconnect backoff, seconds
+_RETRY_MIN = 0.1
+_RETRY_MAX = 5.0
+
+def _batches(requests):
+    batch = []
+    size = 0
+    for op, payload in requests:
+        n = _proto.HEADER.size + len(payload)
+        if batch and (len(batch) == _BATCH_FRAMES or size + n > _BATCH_BYTES):
+            yield batch
+            batch = []
+            size = 0
+        batch.append((op, payload))
+        size += n
+    if batch:
+        yield batch
+
+def _copy(value):
+    # fresh dicts and lists so no caller can change a cached answer, leaves are immutable
+    if type(value) is dict:
+        return {k: _copy(v) for k, v in value.items()}
+    if type(value) is list:
+        return [_copy(v) for v in value]
+    return value
+
+class _Conn:
+    def __init__(self, socketPath, timeout):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(socketPath)
+        except OSError:
+            self.sock.close()
+            raise
+        self.rfile = self.sock.makefile("rb")
+        self.lastId = 0
+
+    def nextId(self):
+        # id 0 is reserved for server pushes
+        self.lastId = self.lastId % 0xFFFFFFFF + 1
+        return self.lastId
+
+    def pipeline(self, requests):
+        # requests is a list of (op, payload), returns (status, payload) per request in order.
+        # requests go out in batches with at most two unanswered, so the server is never
+        # left blocked writing replies while this side is blocked writing requests
+        results = []
+        waiting = None
+        for batch in _batches(requests):
+            ids = []
+            frames = []
+            for op, payload in batch:
+                reqId = self.nextId()
+                ids.append(reqId)
+                frames.append(_proto.frame(reqId, op, payload))
+            self.sock.sendall(b"".join(frames))
+            if waiting:
+                results.extend(self.reply(reqId) for reqId in waiting)
+            waiting = ids
+        if waiting:
+            results.extend(self.reply(reqId) for reqId in waiting)
+        return results
+
+    def reply(self, reqId):
+        resp = _proto.readFrame(self.rfile)
+        if resp is None:
+            raise ConnectionError("server closed the connection")
+        gotId, code, payload = resp
+        if gotId != reqId:
+            raise ConnectionError(f"response id {gotId} does not match request id {reqId}")
+        return code, payload
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+
+class Client:
+    # precondition: socketPath is where a scl.server is listening
+    def __init__(self, socketPath, poolSize=4, cache=True, timeout=5.0):
+        self.socketPath = socketPath
+        self.timeout = timeout
+        self.cache = cache
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(poolSize)
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._listener = None
+        self._listenThread = None
+        self._watched = set()
+        self._callbacks = {}
+        # name -> generation last announced by the server
+        self._gens = {}
+        # name -> (generation, {(kind, path): value}), handed out as copies
+        self._cached = {}
+
+    # pool
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return _Conn(self.socketPath, self.timeout)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, conn, ok):
+        if ok:
+            self._idle.put(conn)
+        else:
+            conn.close()
+        self._slots.release()
+
+    def _dropIdle(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _roundtrip(self, requests):
+        conn = self._acquire()
+        try:
+            try:
+                results = conn.pipeline(requests)
+            except (OSError, ConnectionError):
+                # a restarted server leaves every pooled socket dead, not just this one,
+                # so the retry goes out on a new connection and the rest of the pool is dropped
+                conn.close()
+                self._dropIdle()
+                conn = _Conn(self.socketPath, self.timeout)
+                results = conn.pipeline(requests)
+        except BaseException:
+            self._release(conn, False)
+            raise
+        self._release(conn, True)
+        return results
+
+    # generations and subscriptions
+
+    def _ensureListener(self):
+        with self._lock:
+            if self._listenThread is None:
+                self._listenThread = threading.Thread(target=self._listenLoop, name="scl-client-listen", daemon=True)
+                self._listenThread.start()
+
+    def _watch(self, name):
+        self._ensureListener()
+        with self._lock:
+            if name in self._watched:
+                return
+            self._watched.add(name)
+            conn = self._listener
+            if conn is not None:
+                try:
+                    conn.sock.sendall(_proto.frame(conn.nextId(), _proto.SUBSCRIBE, name.encode()))
+                except OSError:
+                    # the listener sees the broken connection and resubscribes after reconnecting
+                    pass
+
+    def _listenLoop(self):
+        # keeps one subscription connection alive, resubscribing every watched name on reconnect
+        delay = _RETRY_MIN
+        while not self._closed.is_set():
+            try:
+                conn = _Conn(self.socketPath, None)
+            except OSError:
+                self._closed.wait(delay)
+                delay = min(delay * 2, _RETRY_MAX)
+                continue
+            delay = _RETRY_MIN
+            try:
+                with self._lock:
+                    if self._closed.is_set():
+                        return
+                    self._listener = conn
+                    frames = [_proto.frame(conn.nextId(), _proto.SUBSCRIBE, n.encode()) for n in self._watched]
+                    if frames:
+                        conn.sock.sendall(b"".join(frames))
+                self._listen(conn)
+            except (OSError, ConnectionError):
+                pass
+            finally:
+                # notifications may have been missed, cached answers can no longer be trusted
+                with self._lock:
+                    self._listener = None
+                    self._cached.clear()
+                conn.close()
+
+    def _listen(self, conn):
+        while True:
+            resp = _proto.readFrame(conn.rfile)
+            if resp is None:
+                return
+            _reqId, code, payload = resp
+            if code not in (_proto.OK, _proto.CHANGED) or len(payload) < _proto.GEN.size:
+                continue
+            gen, name = _proto.splitGen(payload)
+            name = name.decode()
+            prev = self._setGen(name, gen)
+            # a newer generation in a resubscribe reply means a change was missed while disconnected
+            if gen > prev and (code == _proto.CHANGED or prev):
+                self._fire(name, gen)
+
+    def _fire(self, name, gen):
+        for cb in list(self._callbacks.get(name, ())):
+            try:
+                cb(name, gen)
+            except Exception:
+                _log.exception("subscriber callback for %s failed", name)
+
+    def _setGen(self, name, gen):
+        # returns the generation known before
+        with self._lock:
+            prev = self._gens.get(name, 0)
+            if gen > prev:
+                self._gens[name] = gen
+                self._cached.pop(name, None)
+            return prev
+
+    def subscribe(self, name, callback):
+        # callback(name, generation) runs on the listener thread after every reload,
+        # and once after a reconnect if the doc changed in the meantime
+        with self._lock:
+            self._callbacks.setdefault(name, []).append(callback)
+        self._watch(name)
+
+    def unsubscribe(self, name, callback):
+        with self._lock:
+            cbs = self._callbacks.get(name, [])
+            if callback in cbs:
+                cbs.remove(callback)
+
+    # cache
+
+    def _cacheGet(self, name, key):
+        with self._lock:
+            entry = self._cached.get(name)
+            if entry is None or entry[0] != self._gens.get(name):
+                return None
+            return entry[1].get(key)
+
+    def _cachePut(self, name, gen, key, value):
+        # returns True when kept.
+        # only the listener moves generations forward, otherwise a reply that beats the CHANGED
+        # push would swallow its callbacks; answers from a generation not yet announced are not kept
+        with self._lock:
+            if self._listener is None or name not in self._watched or self._gens.get(name) != gen:
+                return False
+            entry = self._cached.get(name)
+            if entry is None or entry[0] != gen:
+                entry = (gen, {})
+                self._cached[name] = entry
+            entry[1][key] = value
+            return True
+
+    # queries
+
+    def _request(self, kind, name, path):
+        if kind == "get":
+            return _proto.GET, _proto.getPayload(name, path)
+        return _proto.TEXT, name.encode()
+
+    def _result(self, kind, name, path, code, payload):
+        if code == _proto.NOT_FOUND:
+            return None
+        if code != _proto.OK:
+            raise ServerError(payload.decode() or f"server status {code}")
+        gen, body = _proto.splitGen(payload)
+        if kind == "get":
+            value = _codec.decodeMsgpack(body)
+        else:
+            value = body.decode()
+        if self.cache and self._cachePut(name, gen, (kind, path), value):
+            return _copy(value)
+        return value
+
+    def _query(self, kind, name, path=""):
+        if self.cache:
+            self._watch(name)
+            hit = self._cacheGet(name, (kind, path))
+            if hit is not None:
+                return _copy(hit)
+        code, payload = self._roundtrip([self._request(kind, name, path)])[0]
+        return self._result(kind, name, path, code, payload)
+
+    def get(self, name, path=""):
+        # value at a dot-separated path as plain python objects, "" for the whole doc, None if missing
+        return self._query("get", name, path)
+
+    def getMany(self, queries):
+        # queries is a list of (name, path); misses go out pipelined on one connection
+        results = [None] * len(queries)
+        misses = []
+        for i, (name, path) in enumerate(queries):
+            if self.cache:
+                self._watch(name)
+                hit = self._cacheGet(name, ("get", path))
+                if hit is not None:
+                    results[i] = _copy(hit)
+                    continue
+            misses.append(i)
+        if misses:
+            replies = self._roundtrip([self._request("get", *queries[i]) for i in misses])
+            for i, (code, payload) in zip(misses, replies):
+                name, path = queries[i]
+                results[i] = self._result("get", name, path, code, payload)
+        return results
+
+    def text(self, name):
+        # serialize() text of the doc, None if the server does not serve it
+        return self._query("text", name)
+
+    def generation(self, name):
+        code, payload = self._roundtrip([(_proto.GENERATION, name.encode())])[0]
+        if code == _proto.NOT_FOUND:
+            return None
+        if code != _proto.OK:
+            raise ServerError(payload.decode() or f"server status {code}")
+        return _proto.splitGen(payload)[0]
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            listener = self._listener
+        if listener is not None:
+            try:
+                listener.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._dropIdle()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
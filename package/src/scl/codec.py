@@ -0,0 +1,733 @@
+import pickle
+import struct
+
+from . import native as _native
+
+# binary export: msgpack and cbor written straight from the native tree
+#
+# extension codes reuse the scl type constants so both formats map the same way:
+#   msgpack ext type N      -> scl type N
+#   cbor tag TAG_BASE + N   -> scl type N
+#
+# UINT      ext payload / tagged item is the unsigned integer
+# DATE      ext payload / tagged item is the text form, e.g. "2024-01-15"
+# DATETIME  ext payload / tagged item is the text form, e.g. "2024-01-15T10:00:00Z"
+# DURATION  ext payload / tagged item is the text form, e.g. "3h30m"
+# MAP       ext payload / tagged item is the encoded map
+#
+# everything else uses the native format types: nil, bool, int, float64, str, bin, array, map
+
+TAG_BASE = 0xB900
+
+_FLUSH_AT = 1 << 16
+
+# pickle snapshots only: ext payload is a u32 index into the out-of-band buffer list
+_BUFFER_REF = 0x40
+_OOB_MIN = 1 << 16
+
+_U16 = struct.Struct(">H")
+_U32 = struct.Struct(">I")
+_U64 = struct.Struct(">Q")
+_I8  = struct.Struct(">b")
+_I16 = struct.Struct(">h")
+_I32 = struct.Struct(">i")
+_I64 = struct.Struct(">q")
+_F16 = struct.Struct(">e")
+_F32 = struct.Struct(">f")
+_F64 = struct.Struct(">d")
+
+_TEMPORAL = (_native.DATE, _native.DATETIME, _native.DURATION)
+
+# writers
+
+class _Writer:
+    # precondition: fp is None or has a binary write()
+    def __init__(self, fp=None):
+        self.buf = bytearray()
+        self.fp = fp
+        self.pending = 0
+        self.tree = _native.TreeReader()
+
+    def maybeFlush(self):
+        if self.pending == 0 and len(self.buf) >= _FLUSH_AT:
+            self.fp.write(self.buf)
+            self.buf = bytearray()
+
+    def finish(self):
+        if self.fp is None:
+            return bytes(self.buf)
+        if self.buf:
+            self.fp.write(self.buf)
+        self.buf = bytearray()
+        return None
+
+    def value(self, ptr):
+        if ptr is None:
+            self.nil()
+            return
+        tree = self.tree
+        t = tree.type(ptr)
+        if t == _native.STRING:
+            self.text(tree.text(t, ptr))
+        elif t == _native.INT:
+            self.int(tree.int(ptr))
+        elif t == _native.STRUCT:
+            self.entries(tree.entries(ptr))
+        elif t == _native.LIST:
+            n = tree.listLen(ptr)
+            self.arrayHead(n)
+            listGet = tree.listGet
+            for i in range(n):
+                self.value(listGet(ptr, i))
+        elif t == _native.FLOAT:
+            self.float(tree.float(ptr))
+        elif t == _native.BOOL:
+            self.bool(tree.bool(ptr))
+        elif t == _native.UINT:
+            self.uint(tree.uint(ptr))
+        elif t == _native.NULL:
+            self.nil()
+        elif t == _native.BYTES:
+            self.bin(tree.bytes(ptr))
+        elif t in _TEMPORAL:
+            self.temporal(t, tree.text(t, ptr))
+        elif t == _native.MAP:
+            self.map(tree.entries(ptr))
+        else:
+            raise ValueError(f"unsupported value type: {t}")
+        if self.fp is not None:
+            self.maybeFlush()
+
+    def entries(self, entries):
+        # keys are raw utf-8 from the native layer
+        self.mapHead(len(entries))
+        for k, v in entries:
+            self.text(k)
+            self.value(v)
+
+    def doc(self, docPtr):
+        self.entries(self.tree.docEntries(docPtr))
+        return self.finish()
+
+
+class _MsgpackWriter(_Writer):
+    def nil(self):
+        self.buf.append(0xC0)
+
+    def bool(self, v):
+        self.buf.append(0xC3 if v else 0xC2)
+
+    def int(self, v):
+        buf = self.buf
+        if v >= 0:
+            self.positive(v)
+        elif v >= -32:
+            buf.append(v & 0xFF)
+        elif v >= -0x80:
+            buf.append(0xD0)
+            buf += _I8.pack(v)
+        elif v >= -0x8000:
+            buf.append(0xD1)
+            buf += _I16.pack(v)
+        elif v >= -0x80000000:
+            buf.append(0xD2)
+            buf += _I32.pack(v)
+        else:
+            buf.append(0xD3)
+            buf += _I64.pack(v)
+
+    def uint(self, v):
+        # fixext8 keeps UINT distinct from non-negative INT
+        self.buf.append(0xD7)
+        self.buf += _I8.pack(_native.UINT)
+        self.buf += _U64.pack(v)
+
+    def positive(self, v):
+        buf = self.buf
+        if v < 0x80:
+            buf.append(v)
+        elif v < 0x100:
+            buf.append(0xCC)
+            buf.append(v)
+        elif v < 0x10000:
+            buf.append(0xCD)
+            buf += _U16.pack(v)
+        elif v < 0x100000000:
+            buf.append(0xCE)
+            buf += _U32.pack(v)
+        else:
+            buf.append(0xCF)
+            buf += _U64.pack(v)
+
+    def float(self, v):
+        self.buf.append(0xCB)
+        self.buf += _F64.pack(v)
+
+    def text(self, data):
+        buf = self.buf
+        n = len(data)
+        if n < 32:
+            buf.append(0xA0 | n)
+        elif n < 0x100:
+            buf.append(0xD9)
+            buf.append(n)
+        elif n < 0x10000:
+            buf.append(0xDA)
+            buf += _U16.pack(n)
+        else:
+            buf.append(0xDB)
+            buf += _U32.pack(n)
+        buf += data
+
+    def bin(self, data):
+        buf = self.buf
+        n = len(data)
+        if n < 0x100:
+            buf.append(0xC4)
+            buf.append(n)
+        elif n < 0x10000:
+            buf.append(0xC5)
+            buf += _U16.pack(n)
+        else:
+            buf.append(0xC6)
+            buf += _U32.pack(n)
+        buf += data
+
+    def ext(self, code, data):
+        buf = self.buf
+        n = len(data)
+        if n < 0x100:
+            buf.append(0xC7)
+            buf.append(n)
+        elif n < 0x10000:
+            buf.append(0xC8)
+            buf += _U16.pack(n)
+        else:
+            buf.append(0xC9)
+            buf += _U32.pack(n)
+        buf += _I8.pack(code)
+        buf += data
+
+    def temporal(self, t, data):
+        self.ext(t, data)
+
+    def arrayHead(self, n):
+        buf = self.buf
+        if n < 16:
+            buf.append(0x90 | n)
+        elif n < 0x10000:
+            buf.append(0xDC)
+            buf += _U16.pack(n)
+        else:
+            buf.append(0xDD)
+            buf += _U32.pack(n)
+
+    def mapHead(self, n):
+        buf = self.buf
+        if n < 16:
+            buf.append(0x80 | n)
+        elif n < 0x10000:
+            buf.append(0xDE)
+            buf += _U16.pack(n)
+        else:
+            buf.append(0xDF)
+            buf += _U32.pack(n)
+
+    def map(self, entries):
+        # ext32 header, length patched once the nested map is written
+        buf = self.buf
+        buf.append(0xC9)
+        at = len(buf)
+        buf += b"\x00\x00\x00\x00"
+        buf += _I8.pack(_native.MAP)
+        start = len(buf)
+        self.pending += 1
+        self.entries(entries)
+        self.pending -= 1
+        _U32.pack_into(self.buf, at, len(self.buf) - start)
+
+
+class _CborWriter(_Writer):
+    def head(self, major, n):
+        buf = self.buf
+        major <<= 5
+        if n < 24:
+            buf.append(major | n)
+        elif n < 0x100:
+            buf.append(major | 24)
+            buf.append(n)
+        elif n < 0x10000:
+            buf.append(major | 25)
+            buf += _U16.pack(n)
+        elif n < 0x100000000:
+            buf.append(major | 26)
+            buf += _U32.pack(n)
+        else:
+            buf.append(major | 27)
+            buf += _U64.pack(n)
+
+    def nil(self):
+        self.buf.append(0xF6)
+
+    def bool(self, v):
+        self.buf.append(0xF5 if v else 0xF4)
+
+    def int(self, v):
+        if v >= 0:
+            self.head(0, v)
+        else:
+            self.head(1, -1 - v)
+
+    def uint(self, v):
+        self.head(6, TAG_BASE + _native.UINT)
+        self.head(0, v)
+
+    def float(self, v):
+        self.buf.append(0xFB)
+        self.buf += _F64.pack(v)
+
+    def text(self, data):
+        self.head(3, len(data))
+        self.buf += data
+
+    def bin(self, data):
+        self.head(2, len(data))
+        self.buf += data
+
+    def temporal(self, t, data):
+        self.head(6, TAG_BASE + t)
+        self.text(data)
+
+    def arrayHead(self, n):
+        self.head(4, n)
+
+    def mapHead(self, n):
+        self.head(5, n)
+
+    def map(self, entries):
+        self.head(6, TAG_BASE + _native.MAP)
+        self.entries(entries)
+
+
+class _NotRebuildable(Exception):
+    pass
+
+
+class _SnapshotWriter(_MsgpackWriter):
+    # msgpack limited to what the builder can rebuild, large BYTES optionally out-of-band
+    def __init__(self, oob):
+        super().__init__()
+        self.oob = oob
+        self.buffers = []
+
+    def bin(self, data):
+        if self.oob and len(data) >= _OOB_MIN:
+            self.ext(_BUFFER_REF, _U32.pack(len(self.buffers)))
+            self.buffers.append(pickle.PickleBuffer(data))
+            return
+        super().bin(data)
+
+    def temporal(self, t, data):
+        raise _NotRebuildable()
+
+    def map(self, entries):
+        raise _NotRebuildable()
+
+
+def toMsgpack(docPtr, fp=None):
+    return _MsgpackWriter(fp).doc(docPtr)
+
+def toCbor(docPtr, fp=None):
+    return _CborWriter(fp).doc(docPtr)
+
+def valueToMsgpack(ptr):
+    w = _MsgpackWriter()
+    w.value(ptr)
+    return w.finish()
+
+# readers
+
+class _Reader:
+    # tagged maps become structs only when asked for, the native builder has no map constructor
+    mapsAsStructs = False
+
+    # precondition: data is bytes-like or a binary file object
+    def __init__(self, docPtr, data, buffers=None):
+        if hasattr(data, "read"):
+            data = data.read()
+        self.doc = docPtr
+        self.data = memoryview(data).cast("B")
+        self.pos = 0
+        self.buffers = buffers
+
+    def take(self, n):
+        end = self.pos + n
+        if end > len(self.data):
+            raise ValueError(f"{self.name}: truncated input at offset {self.pos}")
+        chunk = self.data[self.pos:end]
+        self.pos = end
+        return chunk
+
+    def byte(self):
+        if self.pos >= len(self.data):
+            raise ValueError(f"{self.name}: truncated input at offset {self.pos}")
+        b = self.data[self.pos]
+        self.pos += 1
+        return b
+
+    def unpack(self, st):
+        return st.unpack(self.take(st.size))[0]
+
+    # native builders, overridden by _PyBuild
+
+    def mkNull(self):
+        return _native.valNull(self.doc)
+
+    def mkBool(self, v):
+        return _native.valBool(self.doc, v)
+
+    def mkInt(self, v):
+        return _native.valInt(self.doc, v)
+
+    def mkUint(self, v):
+        return _native.valUint(self.doc, v)
+
+    def mkFloat(self, v):
+        return _native.valFloat(self.doc, v)
+
+    def mkStr(self, data):
+        return _native.valString(self.doc, data)
+
+    def mkBytes(self, data):
+        return _native.valBytes(self.doc, data)
+
+    def mkText(self, code, read):
+        # read() returns the text form, encoded for msgpack and decoded for cbor
+        raise ValueError(
+            f"{self.name}: type {code} cannot be rebuilt, the native library has no constructor for it"
+        )
+
+    def fillList(self, n):
+        lst = _native.valListNew(self.doc)
+        for _ in range(n):
+            _native.docListPush(self.doc, lst, self.value())
+        return lst
+
+    def fillStruct(self, n):
+        st = _native.valStructNew(self.doc)
+        for _ in range(n):
+            key = self.key()
+            _native.docStructSet(self.doc, st, key, self.value())
+        return st
+
+    def setRoot(self, key, val):
+        _native.docSet(self.doc, key, val)
+
+    def intVal(self, v):
+        if v > 0x7FFFFFFFFFFFFFFF:
+            return self.mkUint(v)
+        return self.mkInt(v)
+
+    def taggedVal(self, code, read):
+        # code is an scl type constant, read() decodes the wrapped item
+        if code == _native.UINT:
+            v = read()
+            if not isinstance(v, int) or v < 0:
+                raise ValueError(f"{self.name}: malformed uint extension")
+            return self.mkUint(v)
+        if code == _native.MAP:
+            if not self.mapsAsStructs:
+                raise ValueError(
+                    f"{self.name}: maps cannot be rebuilt, the native library has no constructor for them; "
+                    "pass mapsAsStructs=True to load them as structs"
+                )
+            return read()
+        if code in _TEMPORAL:
+            return self.mkText(code, read)
+        raise ValueError(f"{self.name}: unknown extension {code}")
+
+    def load(self):
+        entries = self.rootEntries()
+        if entries is None:
+            raise ValueError(f"{self.name}: top-level item must be a map")
+        for _ in range(entries):
+            key = self.key()
+            self.setRoot(key, self.value())
+        self.end()
+
+    def end(self):
+        if self.pos != len(self.data):
+            raise ValueError(f"{self.name}: trailing data at offset {self.pos}")
+
+
+class _MsgpackReader(_Reader):
+    name = "msgpack"
+
+    def rootEntries(self):
+        b = self.byte()
+        if 0x80 <= b <= 0x8F:
+            return b & 0x0F
+        if b == 0xDE:
+            return self.unpack(_U16)
+        if b == 0xDF:
+            return self.unpack(_U32)
+        return None
+
+    def key(self):
+        b = self.byte()
+        if 0xA0 <= b <= 0xBF:
+            return bytes(self.take(b & 0x1F))
+        if b == 0xD9:
+            return bytes(self.take(self.byte()))
+        if b == 0xDA:
+            return bytes(self.take(self.unpack(_U16)))
+        if b == 0xDB:
+            return bytes(self.take(self.unpack(_U32)))
+        raise ValueError(f"msgpack: map keys must be strings (offset {self.pos - 1})")
+
+    def ext(self, n):
+        code = self.unpack(_I8)
+        end = self.pos + n
+        if code == _native.UINT:
+            if n != 8:
+                raise ValueError("msgpack: malformed uint extension")
+            v = self.unpack(_U64)
+            result = self.taggedVal(code, lambda: v)
+        elif code == _native.MAP:
+            result = self.taggedVal(code, self.value)
+        elif code == _BUFFER_REF and self.buffers is not None and n == 4:
+            buf = memoryview(self.buffers[self.unpack(_U32)]).cast("B")
+            result = self.mkBytes(buf)
+        else:
+            result = self.taggedVal(code, lambda: bytes(self.take(n)))
+        if self.pos != end:
+            raise ValueError(f"msgpack: extension {code} length mismatch")
+        return result
+
+    def value(self):
+        b = self.byte()
+        if b <= 0x7F:
+            return self.mkInt(b)
+        if b >= 0xE0:
+            return self.mkInt(b - 0x100)
+        if b <= 0x8F:
+            return self.fillStruct(b & 0x0F)
+        if b <= 0x9F:
+            return self.fillList(b & 0x0F)
+        if b <= 0xBF:
+            return self.mkStr(bytes(self.take(b & 0x1F)))
+        if b == 0xC0:
+            return self.mkNull()
+        if b == 0xC2:
+            return self.mkBool(False)
+        if b == 0xC3:
+            return self.mkBool(True)
+        if b == 0xC4:
+            return self.mkBytes(self.take(self.byte()))
+        if b == 0xC5:
+            return self.mkBytes(self.take(self.unpack(_U16)))
+        if b == 0xC6:
+            return self.mkBytes(self.take(self.unpack(_U32)))
+        if b == 0xC7:
+            return self.ext(self.byte())
+        if b == 0xC8:
+            return self.ext(self.unpack(_U16))
+        if b == 0xC9:
+            return self.ext(self.unpack(_U32))
+        if b == 0xCA:
+            return self.mkFloat(self.unpack(_F32))
+        if b == 0xCB:
+            return self.mkFloat(self.unpack(_F64))
+        if b == 0xCC:
+            return self.mkInt(self.byte())
+        if b == 0xCD:
+            return self.mkInt(self.unpack(_U16))
+        if b == 0xCE:
+            return self.mkInt(self.unpack(_U32))
+        if b == 0xCF:
+            return self.intVal(self.unpack(_U64))
+        if b == 0xD0:
+            return self.mkInt(self.unpack(_I8))
+        if b == 0xD1:
+            return self.mkInt(self.unpack(_I16))
+        if b == 0xD2:
+            return self.mkInt(self.unpack(_I32))
+        if b == 0xD3:
+            return self.mkInt(self.unpack(_I64))
+        if 0xD4 <= b <= 0xD8:
+            return self.ext(1 << (b - 0xD4))
+        if b == 0xD9:
+            return self.mkStr(bytes(self.take(self.byte())))
+        if b == 0xDA:
+            return self.mkStr(bytes(self.take(self.unpack(_U16))))
+        if b == 0xDB:
+            return self.mkStr(bytes(self.take(self.unpack(_U32))))
+        if b == 0xDC:
+            return self.fillList(self.unpack(_U16))
+        if b == 0xDD:
+            return self.fillList(self.unpack(_U32))
+        if b == 0xDE:
+            return self.fillStruct(self.unpack(_U16))
+        if b == 0xDF:
+            return self.fillStruct(self.unpack(_U32))
+        raise ValueError(f"msgpack: invalid type byte 0x{b:02x} at offset {self.pos - 1}")
+
+
+class _CborReader(_Reader):
+    name = "cbor"
+
+    def arg(self, info):
+        if info < 24:
+            return info
+        if info == 24:
+            return self.byte()
+        if info == 25:
+            return self.unpack(_U16)
+        if info == 26:
+            return self.unpack(_U32)
+        if info == 27:
+            return self.unpack(_U64)
+        raise ValueError(f"cbor: indefinite or reserved length at offset {self.pos - 1}")
+
+    def rootEntries(self):
+        b = self.byte()
+        if b >> 5 != 5:
+            return None
+        return self.arg(b & 0x1F)
+
+    def key(self):
+        b = self.byte()
+        if b >> 5 != 3:
+            raise ValueError(f"cbor: map keys must be text strings (offset {self.pos - 1})")
+        return bytes(self.take(self.arg(b & 0x1F)))
+
+    def rawUint(self):
+        b = self.byte()
+        if b >> 5 != 0:
+            return None
+        return self.arg(b & 0x1F)
+
+    def value(self):
+        b = self.byte()
+        major, info = b >> 5, b & 0x1F
+        if major == 0:
+            return self.intVal(self.arg(info))
+        if major == 1:
+            return self.mkInt(-1 - self.arg(info))
+        if major == 2:
+            return self.mkBytes(self.take(self.arg(info)))
+        if major == 3:
+            return self.mkStr(bytes(self.take(self.arg(info))))
+        if major == 4:
+            return self.fillList(self.arg(info))
+        if major == 5:
+            return self.fillStruct(self.arg(info))
+        if major == 6:
+            tag = self.arg(info)
+            code = tag - TAG_BASE
+            if code == _native.UINT:
+                return self.taggedVal(code, self.rawUint)
+            return self.taggedVal(code, self.value)
+        if b == 0xF4:
+            return self.mkBool(False)
+        if b == 0xF5:
+            return self.mkBool(True)
+        if b == 0xF6 or b == 0xF7:
+            return self.mkNull()
+        if b == 0xF9:
+            return self.mkFloat(self.unpack(_F16))
+        if b == 0xFA:
+            return self.mkFloat(self.unpack(_F32))
+        if b == 0xFB:
+            return self.mkFloat(self.unpack(_F64))
+        raise ValueError(f"cbor: unsupported item 0x{b:02x} at offset {self.pos - 1}")
+
+
+class _PyBuild:
+    # plain python objects in place of native values, temporal types as their text form, maps as dicts
+    mapsAsStructs = True
+
+    def mkNull(self):
+        return None
+
+    def mkBool(self, v):
+        return v
+
+    def mkInt(self, v):
+        return v
+
+    def mkUint(self, v):
+        return v
+
+    def mkFloat(self, v):
+        return v
+
+    def mkStr(self, data):
+        return str(data, "utf-8")
+
+    def mkBytes(self, data):
+        return bytes(data)
+
+    def mkText(self, code, read):
+        text = read()
+        return text if isinstance(text, str) else text.decode()
+
+    def fillList(self, n):
+        return [self.value() for _ in range(n)]
+
+    def fillStruct(self, n):
+        result = {}
+        for _ in range(n):
+            key = self.key().decode()
+            result[key] = self.value()
+        return result
+
+
+class _MsgpackPyReader(_PyBuild, _MsgpackReader):
+    pass
+
+
+def fromMsgpack(docPtr, data, mapsAsStructs=False):
+    r = _MsgpackReader(docPtr, data)
+    r.mapsAsStructs = mapsAsStructs
+    r.load()
+
+def fromCbor(docPtr, data, mapsAsStructs=False):
+    r = _CborReader(docPtr, data)
+    r.mapsAsStructs = mapsAsStructs
+    r.load()
+
+def decodeMsgpack(data):
+    # any msgpack item to plain python objects, no doc involved
+    r = _MsgpackPyReader(None, data)
+    result = r.value()
+    r.end()
+    return result
+
+# pickle snapshots
+
+def snapshotDoc(docPtr, oob=False):
+    # returns (data, buffers), or None when the tree holds values the builder cannot rebuild
+    w = _SnapshotWriter(oob)
+    try:
+        data = w.doc(docPtr)
+    except _NotRebuildable:
+        return None
+    return data, w.buffers
+
+def snapshotValue(ptr, oob=False):
+    w = _SnapshotWriter(oob)
+    try:
+        w.value(ptr)
+    except _NotRebuildable:
+        return None
+    return w.finish(), w.buffers
+
+def restoreDoc(docPtr, data, buffers):
+    _MsgpackReader(docPtr, data, buffers).load()
+
+def restoreValue(docPtr, data, buffers):
+    r = _MsgpackReader(docPtr, data, buffers)
+    ptr = r.value()
+    r.end()
+    return ptr
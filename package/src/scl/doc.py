@@ -1,12 +1,20 @@
+import pickle
+
 from . import native as _native
+from . import codec as _codec
 from .errors import TomlError
 from .value import Value, ListBuilder, StructBuilder, _makeVal
 
+# the C ABI has no constructors for these, and serialize() text does not parse back
+_UNPICKLABLE = "dates, datetimes, durations and maps cannot be rebuilt, so this tree cannot be pickled"
+
 class Doc:
     # precondition: ptr is a valid doc pointer from the native layer, or None for empty
     def __init__(self, ptr, warnings=None):
         self._ptr = ptr
         self.warnings = warnings or []
+        # (source bytes, opts) of a parsed doc, pickled as text until the doc is modified
+        self._source = None
 
     def __del__(self):
         self._free()
@@ -22,6 +30,32 @@ class Doc:
             _native.freeDoc(self._ptr)
             self._ptr = None
 
+    def _keepSource(self, src, opts):
+        # an @include resolves against the parsing process's paths, such docs go by snapshot
+        if b"@include" not in src:
+            self._source = (src, opts)
+
+    def __reduce_ex__(self, protocol):
+        if self._ptr is None:
+            raise pickle.PicklingError("cannot pickle a freed Doc")
+        if self._source is not None:
+            src, opts = self._source
+            return (_parseSource, (src, opts, list(self.warnings)))
+        snap = _codec.snapshotDoc(self._ptr, oob=protocol >= 5)
+        if snap is None:
+            raise pickle.PicklingError(_UNPICKLABLE)
+        data, buffers = snap
+        return (_restoreDoc, (data, buffers, list(self.warnings)))
+
+    def _reduceValue(self, val, protocol):
+        if self._ptr is None:
+            raise pickle.PicklingError("cannot pickle a Value of a freed Doc")
+        snap = _codec.snapshotValue(val._ptr, oob=protocol >= 5)
+        if snap is None:
+            raise pickle.PicklingError(_UNPICKLABLE)
+        data, buffers = snap
+        return (_restoreValue, (data, buffers))
+
     def get(self, key):
         ptr = _native.get(self._ptr, key)
         if ptr is None:
@@ -65,6 +99,24 @@ class Doc:
         except RuntimeError as e:
             raise TomlError(str(e)) from e
 
+    def toMsgpack(self, fp=None):
+        return _codec.toMsgpack(self._ptr, fp)
+
+    def toCbor(self, fp=None):
+        return _codec.toCbor(self._ptr, fp)
+
+    @staticmethod
+    def fromMsgpack(data, mapsAsStructs=False):
+        doc = Doc.new()
+        _codec.fromMsgpack(doc._ptr, data, mapsAsStructs)
+        return doc
+
+    @staticmethod
+    def fromCbor(data, mapsAsStructs=False):
+        doc = Doc.new()
+        _codec.fromCbor(doc._ptr, data, mapsAsStructs)
+        return doc
+
     @staticmethod
     def new():
         ptr = _native.docNew()
@@ -73,6 +125,7 @@ class Doc:
     def set(self, key, value):
         ptr = _makeVal(self._ptr, value)
         _native.docSet(self._ptr, key, ptr)
+        self._source = None
 
     def val(self, value):
         ptr = _makeVal(self._ptr, value)
@@ -85,3 +138,21 @@ class Doc:
     def newStruct(self):
         structPtr = _native.valStructNew(self._ptr)
         return StructBuilder(self._ptr, structPtr, self)
+
+
+def _parseSource(src, opts, warnings):
+    from .scl import parse
+    doc = parse(src, opts)
+    doc.warnings = warnings
+    return doc
+
+def _restoreDoc(data, buffers, warnings):
+    doc = Doc.new()
+    doc.warnings = warnings
+    _codec.restoreDoc(doc._ptr, data, buffers)
+    return doc
+
+def _restoreValue(data, buffers):
+    doc = Doc.new()
+    ptr = _codec.restoreValue(doc._ptr, data, buffers)
+    return Value(ptr, doc)
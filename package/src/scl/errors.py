@@ -3,3 +3,6 @@ class ParseError(Exception):
 
 class TomlError(Exception):
     pass
+
+class ServerError(Exception):
+    pass
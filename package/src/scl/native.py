@@ -202,6 +202,14 @@ MAP      = 11
 STRUCT   = 12
 UNION    = 13
 
+_valCtors = {
+    STRING: _lib.scl_val_string,
+    INT:    _lib.scl_val_int,
+    UINT:   _lib.scl_val_uint,
+    FLOAT:  _lib.scl_val_float,
+    BOOL:   _lib.scl_val_bool,
+}
+
 # public api
 
 def version():
@@ -227,9 +235,11 @@ def parseFile(path, opts=None):
     return _lib.scl_parse_file(path)
 
 def freeResult(result):
-    if result.error:
-        _libc.free(ctypes.cast(result.error, ctypes.c_void_p))
-        result.error = None
+    # reading result.error gives a python bytes copy, the malloc'd pointer has to be read raw
+    err = ctypes.c_void_p.from_buffer(result, SclResult.error.offset)
+    if err.value:
+        _libc.free(err)
+        err.value = None
     _lib.scl_result_free_warnings(ctypes.byref(result))
 
 def freeDoc(doc):
@@ -354,7 +364,7 @@ def valNull(doc):
     return _lib.scl_val_null(doc)
 
 def valBytes(doc, data):
-    arr = (ctypes.c_uint8 * len(data))(*data)
+    arr = (ctypes.c_uint8 * len(data)).from_buffer_copy(data)
     return _lib.scl_val_bytes(doc, arr, len(data))
 
 def valListNew(doc):
@@ -371,6 +381,34 @@ def docStructSet(doc, strct, key, val):
         key = key.encode()
     _lib.scl_doc_struct_set(doc, strct, key, val)
 
+def valMaker(kind):
+    # constructor f(doc, v) -> ptr for a scalar type, STRING expects v already encoded
+    if kind == NULL:
+        return lambda doc, _v: _lib.scl_val_null(doc)
+    if kind == BYTES:
+        return valBytes
+    make = _valCtors.get(kind)
+    if make is None:
+        raise ValueError(f"cannot build values of type {kind} in bulk")
+    return make
+
+def listExtend(doc, lst, make, values):
+    push = _lib.scl_doc_list_push
+    try:
+        for v in values:
+            push(doc, lst, make(doc, v))
+    except ctypes.ArgumentError as e:
+        raise TypeError(f"value does not match the declared type: {e}") from None
+
+def structUpdate(doc, strct, make, items):
+    # precondition: keys are bytes
+    setField = _lib.scl_doc_struct_set
+    try:
+        for k, v in items:
+            setField(doc, strct, k, make(doc, v))
+    except ctypes.ArgumentError as e:
+        raise TypeError(f"value or key does not match the declared type: {e}") from None
+
 def docSet(doc, key, val):
     if isinstance(key, str):
         key = key.encode()
@@ -397,3 +435,74 @@ def toToml(doc):
     result = r.str.data[:r.str.len].decode()
     _lib.scl_str_result_free(ctypes.byref(r))
     return result
+
+class TreeReader:
+    # tree walks for the binary encoders: out params allocated once, strings and keys stay bytes,
+    # one callback object shared by every struct scan; not thread-safe, use one per walk
+    def __init__(self):
+        self._str   = ctypes.c_char_p()
+        self._int   = ctypes.c_int64(0)
+        self._uint  = ctypes.c_uint64(0)
+        self._float = ctypes.c_double(0.0)
+        self._bool  = ctypes.c_bool(False)
+        self._data  = ctypes.POINTER(ctypes.c_uint8)()
+        self._size  = ctypes.c_size_t(0)
+        self._items = []
+        self._strRef   = ctypes.byref(self._str)
+        self._intRef   = ctypes.byref(self._int)
+        self._uintRef  = ctypes.byref(self._uint)
+        self._floatRef = ctypes.byref(self._float)
+        self._boolRef  = ctypes.byref(self._bool)
+        self._dataRef  = ctypes.byref(self._data)
+        self._sizeRef  = ctypes.byref(self._size)
+
+        def collect(key, val, _userdata):
+            self._items.append((key, val))
+            return True
+        self._cb = _cbType(collect)
+
+        self.type    = _lib.scl_value_type
+        self.listLen = _lib.scl_list_len
+        self.listGet = _lib.scl_list_get
+        self._text = {
+            STRING:   _lib.scl_value_string,
+            DATE:     _lib.scl_value_date,
+            DATETIME: _lib.scl_value_datetime,
+            DURATION: _lib.scl_value_duration,
+        }
+
+    def text(self, kind, val):
+        # raw utf-8 of a STRING, DATE, DATETIME or DURATION value
+        self._text[kind](val, self._strRef)
+        return self._str.value
+
+    def int(self, val):
+        _lib.scl_value_int(val, self._intRef)
+        return self._int.value
+
+    def uint(self, val):
+        _lib.scl_value_uint(val, self._uintRef)
+        return self._uint.value
+
+    def float(self, val):
+        _lib.scl_value_float(val, self._floatRef)
+        return self._float.value
+
+    def bool(self, val):
+        _lib.scl_value_bool(val, self._boolRef)
+        return self._bool.value
+
+    def bytes(self, val):
+        _lib.scl_value_bytes(val, self._dataRef, self._sizeRef)
+        return ctypes.string_at(self._data, self._size.value)
+
+    def entries(self, val):
+        # [(key bytes, value ptr)] of a struct or map, in document order
+        self._items = []
+        _lib.scl_struct_each(val, self._cb, None)
+        return self._items
+
+    def docEntries(self, doc):
+        self._items = []
+        _lib.scl_each_key(doc, self._cb, None)
+        return self._items
@@ -0,0 +1,74 @@
+import struct
+
+# wire format shared by scl.server and scl.client
+#
+# every frame is a fixed header followed by the payload:
+#   u32 payload length, u32 request id, u8 op (request) or status (response)
+#
+# requests may be pipelined; responses come back in request order and carry the same id.
+# pushes from the server use request id 0.
+#
+# op            request payload        OK response payload
+# GET           name \0 path           gen + msgpack of the value at path, "" = whole doc
+# TEXT          name                   gen + serialize() text
+# GEN           name                   gen
+# SUBSCRIBE     name                   gen + name, then CHANGED pushes on every reload
+# UNSUBSCRIBE   name                   empty
+#
+# CHANGED push payload is gen + name, ERROR payload is a utf-8 message.
+# gen is a u64 document generation, it only grows, also across server restarts.
+
+HEADER = struct.Struct(">IIB")
+GEN    = struct.Struct(">Q")
+
+MAX_FRAME = 64 << 20
+
+GET         = 1
+TEXT        = 2
+GENERATION  = 3
+SUBSCRIBE   = 4
+UNSUBSCRIBE = 5
+
+OK        = 0
+NOT_FOUND = 1
+ERROR     = 2
+CHANGED   = 3
+
+PUSH_ID = 0
+
+def frame(reqId, code, payload=b""):
+    return HEADER.pack(len(payload), reqId, code) + payload
+
+def sendFrame(sock, reqId, code, payload=b""):
+    # large payloads go out without being copied behind the header
+    header = HEADER.pack(len(payload), reqId, code)
+    if len(payload) < 1 << 16:
+        sock.sendall(header + payload)
+    else:
+        sock.sendall(header)
+        sock.sendall(payload)
+
+def readFrame(rfile):
+    # precondition: rfile is a buffered binary reader; returns None on clean eof
+    header = rfile.read(HEADER.size)
+    if not header:
+        return None
+    if len(header) != HEADER.size:
+        raise ConnectionError("connection closed inside a frame header")
+    size, reqId, code = HEADER.unpack(header)
+    if size > MAX_FRAME:
+        raise ConnectionError(f"frame of {size} bytes exceeds the {MAX_FRAME} byte limit")
+    payload = rfile.read(size) if size else b""
+    if len(payload) != size:
+        raise ConnectionError("connection closed inside a frame payload")
+    return reqId, code, payload
+
+def getPayload(name, path=""):
+    return name.encode() + b"\0" + path.encode()
+
+def splitGetPayload(payload):
+    name, _, path = payload.partition(b"\0")
+    return name.decode(), path.decode()
+
+def splitGen(payload):
+    return GEN.unpack_from(payload)[0], payload[GEN.size:]
@@ -24,6 +24,8 @@ def version():
 
 def parse(src, opts=None):
     # precondition: src is str or bytes
+    if isinstance(src, str):
+        src = src.encode()
     nativeOpts = opts.toNative() if opts is not None else None
     r = _native.parseStr(src, nativeOpts)
 
@@ -43,10 +45,22 @@ def parse(src, opts=None):
     if not ok:
         raise ParseError(msg or "parse failed")
 
-    return Doc(doc, warnings)
+    result = Doc(doc, warnings)
+    result._keepSource(src, opts)
+    return result
 
 def parseFile(path, opts=None):
     # precondition: path is str
+    try:
+        with open(path, "rb") as f:
+            src = f.read()
+    except OSError:
+        src = None
+    # parsed from the bytes read here so the source kept for pickling is exactly what was parsed;
+    # includes resolve against the file's directory and need the native file parse
+    if src is not None and b"@include" not in src:
+        return parse(src, opts)
+
     nativeOpts = opts.toNative() if opts is not None else None
     r = _native.parseFile(path, nativeOpts)
 
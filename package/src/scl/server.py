@@ -0,0 +1,319 @@
+import argparse
+import logging
+import os
+import queue
+import socket
+import socketserver
+import stat
+import struct
+import threading
+import time
+
+from . import codec as _codec
+from . import protocol as _proto
+from .errors import ParseError
+from .scl import parseFile
+
+# local config daemon: parsed docs served over a unix socket, see protocol.py for the wire format
+
+_log = logging.getLogger("scl.server")
+
+_CACHE_MAX = 4096
+
+# a peer that cannot take a frame within this many seconds is dropped
+_SEND_TIMEOUT = 2.0
+
+class _Entry:
+    # one file at one generation, replaced as a whole on reload
+    def __init__(self, doc, gen, stamp):
+        self.doc = doc
+        self.gen = gen
+        self.stamp = stamp
+        self.genBytes = _proto.GEN.pack(gen)
+        self.lock = threading.Lock()
+        # (op, path) -> response payload, whole-doc answers are encoded up front
+        self.cache = {
+            (_proto.GET, ""): self.genBytes + doc.toMsgpack(),
+            (_proto.TEXT, ""): self.genBytes + doc.serialize().encode(),
+        }
+
+    def answer(self, op, path):
+        key = (op, path)
+        body = self.cache.get(key)
+        if body is not None:
+            return _proto.OK, body
+        with self.lock:
+            body = self.cache.get(key)
+            if body is None:
+                val = self.doc.getPath(path)
+                if val is None:
+                    return _proto.NOT_FOUND, b""
+                body = self.genBytes + _codec.valueToMsgpack(val._ptr)
+                if len(self.cache) < _CACHE_MAX:
+                    self.cache[key] = body
+        return _proto.OK, body
+
+
+class _Conn:
+    # server side of one client connection, pushes and replies share the write lock
+    def __init__(self, sock):
+        self.sock = sock
+        self.lock = threading.Lock()
+        self.names = set()
+        # send-only timeout, reads stay blocking so idle clients are kept
+        secs = int(_SEND_TIMEOUT)
+        usecs = int((_SEND_TIMEOUT - secs) * 1e6)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, struct.pack("ll", secs, usecs))
+
+    def send(self, reqId, code, payload=b""):
+        with self.lock:
+            try:
+                _proto.sendFrame(self.sock, reqId, code, payload)
+            except OSError:
+                # a partial frame may be out, the stream is unusable; this also ends the read loop
+                self.drop()
+                raise
+
+    def drop(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        app = self.server.app
+        conn = _Conn(self.request)
+        with app._subsLock:
+            app._conns.add(conn)
+        try:
+            while True:
+                req = _proto.readFrame(self.rfile)
+                if req is None:
+                    break
+                reqId, op, payload = req
+                try:
+                    code, body = app.dispatch(conn, op, payload)
+                except Exception as e:
+                    code, body = _proto.ERROR, str(e).encode()
+                conn.send(reqId, code, body)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            app.unsubscribeAll(conn)
+            with app._subsLock:
+                app._conns.discard(conn)
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    # the default backlog of 5 overflows when several clients connect at once,
+    # and a unix connect with a timeout then fails with EAGAIN instead of waiting
+    request_queue_size = socket.SOMAXCONN
+
+    def __init__(self, path, mode):
+        self.mode = mode
+        super().__init__(path, _Handler)
+
+    def server_bind(self):
+        super().server_bind()
+        # before listen(), so no client can connect while the socket has umask permissions
+        if self.mode is not None:
+            os.chmod(self.server_address, self.mode)
+
+
+class Server:
+    # precondition: files maps names to .scl paths, or is a list of paths named by their stem.
+    # mode is applied to the socket file, None keeps the umask default
+    def __init__(self, socketPath, files, interval=1.0, opts=None, mode=0o660):
+        if not isinstance(files, dict):
+            files = {os.path.splitext(os.path.basename(p))[0]: p for p in files}
+        self.socketPath = socketPath
+        self.files = dict(files)
+        self.interval = interval
+        self.opts = opts
+        self.mode = mode
+        self._entries = {}
+        # name -> stamp of the last edit that failed to load
+        self._failed = {}
+        self._subs = {}
+        self._conns = set()
+        self._subsLock = threading.Lock()
+        self._stop = threading.Event()
+        self._pushes = queue.SimpleQueue()
+        self._server = None
+        self._watcher = None
+        for name, path in self.files.items():
+            self._entries[name] = self._load(path, 0)
+
+    def _load(self, path, prevGen):
+        st = os.stat(path)
+        doc = parseFile(path, self.opts)
+        # wall-clock based so generations keep growing across restarts
+        gen = max(prevGen + 1, time.time_ns())
+        return _Entry(doc, gen, (st.st_mtime_ns, st.st_size))
+
+    def generation(self, name):
+        return self._entries[name].gen
+
+    def reload(self, name):
+        # returns True when the doc was replaced
+        entry = self._entries[name]
+        try:
+            self._entries[name] = self._load(self.files[name], entry.gen)
+        except (OSError, ParseError) as e:
+            _log.warning("keeping generation %d of %s: %s", entry.gen, name, e)
+            return False
+        self._notify(name)
+        return True
+
+    def _notify(self, name):
+        # pushes go out on their own thread so a slow subscriber never delays reload checks
+        entry = self._entries[name]
+        self._pushes.put((name, entry.genBytes + name.encode()))
+
+    def _push(self):
+        while True:
+            item = self._pushes.get()
+            if item is None:
+                return
+            name, payload = item
+            with self._subsLock:
+                conns = list(self._subs.get(name, ()))
+            for conn in conns:
+                try:
+                    conn.send(_proto.PUSH_ID, _proto.CHANGED, payload)
+                except OSError:
+                    _log.warning("dropping subscriber of %s that fell behind", name)
+                    self.unsubscribeAll(conn)
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            for name, path in self.files.items():
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                stamp = (st.st_mtime_ns, st.st_size)
+                if stamp != self._entries[name].stamp and stamp != self._failed.get(name):
+                    # a broken edit is reported once, not on every check
+                    if not self.reload(name):
+                        self._failed[name] = stamp
+
+    def dispatch(self, conn, op, payload):
+        if op == _proto.GET:
+            name, path = _proto.splitGetPayload(payload)
+        else:
+            name, path = payload.decode(), ""
+        entry = self._entries.get(name)
+        if entry is None:
+            return _proto.NOT_FOUND, b""
+        if op in (_proto.GET, _proto.TEXT):
+            return entry.answer(op, path)
+        if op == _proto.GENERATION:
+            return _proto.OK, entry.genBytes
+        if op == _proto.SUBSCRIBE:
+            with self._subsLock:
+                self._subs.setdefault(name, set()).add(conn)
+                conn.names.add(name)
+            return _proto.OK, self._entries[name].genBytes + payload
+        if op == _proto.UNSUBSCRIBE:
+            with self._subsLock:
+                self._subs.get(name, set()).discard(conn)
+                conn.names.discard(name)
+            return _proto.OK, b""
+        return _proto.ERROR, f"unknown op {op}".encode()
+
+    def unsubscribeAll(self, conn):
+        with self._subsLock:
+            for name in conn.names:
+                self._subs.get(name, set()).discard(conn)
+            conn.names.clear()
+
+    def _bind(self):
+        try:
+            mode = os.lstat(self.socketPath).st_mode
+        except FileNotFoundError:
+            mode = None
+        if mode is not None:
+            if not stat.S_ISSOCK(mode):
+                raise FileExistsError(f"{self.socketPath} exists and is not a socket")
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socketPath)
+            except OSError:
+                # stale socket left by a server that did not shut down cleanly
+                os.unlink(self.socketPath)
+            else:
+                raise OSError(f"another server is listening on {self.socketPath}")
+            finally:
+                probe.close()
+        self._server = _UnixServer(self.socketPath, self.mode)
+        self._server.app = self
+        threading.Thread(target=self._push, name="scl-push", daemon=True).start()
+        if self.interval:
+            self._watcher = threading.Thread(target=self._watch, name="scl-watch", daemon=True)
+            self._watcher.start()
+
+    def start(self):
+        # serves from a background thread
+        self._bind()
+        threading.Thread(target=self._server.serve_forever, name="scl-server", daemon=True).start()
+        return self
+
+    def serveForever(self):
+        self._bind()
+        self._server.serve_forever()
+
+    def close(self):
+        self._stop.set()
+        self._pushes.put(None)
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            # handler threads outlive shutdown(), end their connections so clients see the close
+            with self._subsLock:
+                conns = list(self._conns)
+            for conn in conns:
+                conn.drop()
+            try:
+                os.unlink(self.socketPath)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m scl.server", description="serve parsed .scl files over a unix socket")
+    parser.add_argument("files", nargs="+", metavar="[NAME=]PATH")
+    parser.add_argument("--socket", required=True, help="unix socket path")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between file checks, 0 disables watching")
+    parser.add_argument("--mode", type=lambda s: int(s, 8), default=0o660, help="octal permissions of the socket file, default 660")
+    args = parser.parse_args(argv)
+
+    files = {}
+    for spec in args.files:
+        name, sep, path = spec.partition("=")
+        if not sep:
+            path = name
+            name = os.path.splitext(os.path.basename(path))[0]
+        files[name] = path
+
+    logging.basicConfig(level=logging.INFO, format="%(name)s: %(message)s")
+    server = Server(args.socket, files, interval=args.interval, mode=args.mode)
+    try:
+        server.serveForever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,17 @@
+import itertools
+
 from . import native as _native
 
+_BATCH = 1024
+
 class Value:
     def __init__(self, ptr, doc):
         self._ptr = ptr
         self._doc = doc
 
+    def __reduce_ex__(self, protocol):
+        return self._doc._reduceValue(self, protocol)
+
     @property
     def type(self):
         return _native.valueType(self._ptr)
@@ -105,6 +112,16 @@ class ListBuilder:
         _native.docListPush(self._doc, self._list, ptr)
         return self
 
+    def extend(self, values, type=None):
+        # with a declared type every element must already be of that type
+        make = _maker(type)
+        if type is None:
+            _native.listExtend(self._doc, self._list, make, values)
+            return self
+        for chunk in _batches(values):
+            _native.listExtend(self._doc, self._list, make, _prepare(type, chunk))
+        return self
+
     def build(self):
         return Value(self._list, self._docObj)
 
@@ -120,10 +137,54 @@ class StructBuilder:
         _native.docStructSet(self._doc, self._struct, key, ptr)
         return self
 
+    def update(self, mapping, type=None):
+        # mapping or iterable of (key, value) pairs, same type rules as ListBuilder.extend
+        items = mapping.items() if hasattr(mapping, "items") else mapping
+        make = _maker(type)
+        for chunk in _batches(items):
+            keys = [_key(k) for k, _v in chunk]
+            values = [v for _k, v in chunk]
+            if type is not None:
+                values = _prepare(type, values)
+            _native.structUpdate(self._doc, self._struct, make, zip(keys, values))
+        return self
+
     def build(self):
         return Value(self._struct, self._docObj)
 
 
+def _maker(kind):
+    if kind is None:
+        return _makeVal
+    return _native.valMaker(kind)
+
+def _key(k):
+    # str or bytes, like StructBuilder.set
+    return k.encode() if isinstance(k, str) else k
+
+_RANGES = {
+    _native.INT:  (-1 << 63, (1 << 63) - 1),
+    _native.UINT: (0, (1 << 64) - 1),
+}
+
+def _prepare(kind, chunk):
+    # one batch for a typed constructor: ctypes would wrap out-of-range ints silently
+    bounds = _RANGES.get(kind)
+    if bounds is not None and chunk:
+        if min(chunk) < bounds[0] or max(chunk) > bounds[1]:
+            raise OverflowError(f"value out of range for type {kind}")
+    if kind == _native.STRING:
+        return [_key(s) for s in chunk]
+    return chunk
+
+def _batches(iterable):
+    it = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(it, _BATCH))
+        if not chunk:
+            return
+        yield chunk
+
 def _makeVal(docPtr, value):
     if isinstance(value, Value):
         return value._ptr